@@ -1,38 +1,153 @@
 import os
-import json
+import asyncio
 import csv
+import hashlib
+import hmac
 import io
-import shutil
-import time
-from fastapi import APIRouter, Request, Form, Depends, HTTPException, File, UploadFile
-from fastapi.templating import Jinja2Templates
+import logging
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes run a single worker; the asyncio lock suffices there
+    fcntl = None
+from fastapi import APIRouter, Request, Form, Depends, HTTPException, File, UploadFile, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from itsdangerous import BadSignature, TimestampSigner
 
-# Import custom database functions for Enquiry Vault
-from app.database import get_all_enquiries
+# Import custom database functions for the Enquiry & Identity Vaults
+from app.database import (
+    clear_users, get_all_enquiries, get_all_users, import_users, remove_user, save_user
+)
+from app.data._loader import load_json, load_sites
+from app.data._writer import atomic_write_json
+from app.services import sites_cache
+from app.templating import templates
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
-templates = Jinja2Templates(directory="templates")
+logger = logging.getLogger("InkwakeAdmin")
 
 # Configuration Constants
 DATA_PATH = "app/data/sites_info.json"
 USER_PATH = "app/data/users_info.json"
 UPLOAD_DIR = "static/images"
 ADMIN_PWD = os.getenv("ADMIN_PASSWORD", "admin123")
+COPY_CHUNK_SIZE = 1024 * 1024  # 1MB fallback chunks for upload persistence
+SESSION_MAX_AGE = 3600  # seconds
+
+# Session tokens are HMAC-signed. Without SESSION_SECRET the key is derived from
+# the admin password so every worker still agrees on it.
+_session_signer = TimestampSigner(
+    os.getenv("SESSION_SECRET") or hashlib.sha256(f"inkwake-session:{ADMIN_PWD}".encode()).hexdigest()
+)
 
 # Initialization Protocol
 os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-if not os.path.exists(USER_PATH):
-    with open(USER_PATH, "w", encoding="utf-8") as f:
-        json.dump([], f)
+# One-time move of the legacy JSON Identity Vault into SQLite. Renaming to
+# .migrating claims the import for one worker; the file only becomes
+# .migrated once the rows are committed, and goes back to USER_PATH on
+# failure so the next start retries.
+try:
+    if load_json(USER_PATH):
+        migrating_path = f"{USER_PATH}.migrating"
+        os.replace(USER_PATH, migrating_path)
+        try:
+            import_users(load_json(migrating_path))
+        except BaseException:
+            os.replace(migrating_path, USER_PATH)
+            raise
+        os.replace(migrating_path, f"{USER_PATH}.migrated")
+except FileNotFoundError:
+    pass  # Another worker won the rename
+except Exception as e:
+    logger.error(f"Identity Vault Migration Error (users_info.json kept for retry): {e}")
+
+# Serializes read-modify-write cycles on sites_info.json now that they yield to the loop.
+# That only covers one worker process; _edit_sites adds an flock for the others.
+_sites_write_lock = asyncio.Lock()
+SITES_LOCK_PATH = f"{DATA_PATH}.lock"
+
+def _write_sites(sites):
+    atomic_write_json(DATA_PATH, sites)
+    sites_cache.invalidate()
+
+def _edit_sites(edit, create=False):
+    """
+    Runs load -> edit(sites) -> write on sites_info.json under an exclusive
+    flock on SITES_LOCK_PATH, so edits landing on different workers cannot
+    discard each other. Without `create`, a missing vault is left untouched.
+    """
+    with open(SITES_LOCK_PATH, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file closes
+        if not create and not os.path.exists(DATA_PATH):
+            return
+        try:
+            sites = load_sites()
+        except ValueError:
+            if not create:
+                raise
+            sites = []
+        _write_sites(edit(sites))
+
+# --- Upload Persistence ---
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _store_upload(src, filepath):
+    """
+    Copies an uploaded SpooledTemporaryFile to `filepath`.
+    Disk-backed spools are copied kernel-side with os.sendfile; in-memory
+    spools (or platforms without sendfile) fall back to 1MB os.write chunks.
+    """
+    dst_fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # fileno() would force an in-memory spool to roll over to disk first
+        if getattr(src, "_rolled", True):
+            try:
+                src_fd = src.fileno()
+                size = os.fstat(src_fd).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except (AttributeError, OSError):
+                os.ftruncate(dst_fd, 0)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+
+        src.seek(0)
+        while chunk := src.read(COPY_CHUNK_SIZE):
+            _write_all(dst_fd, chunk)
+    finally:
+        os.close(dst_fd)
+
+def _slug(name: str, sep: str = "-"):
+    """Site id / filename stem for a monument name, computed once at write time."""
+    return name.lower().replace(" ", sep)
+
+async def _save_image(image_file: UploadFile, name: str):
+    """Persists an admin image upload off the event loop and returns its public URL."""
+    ext = os.path.splitext(image_file.filename)[1]
+    local_filename = f"{_slug(name, '_')}{ext}"
+    filepath = os.path.join(UPLOAD_DIR, local_filename)
+    await run_in_threadpool(_store_upload, image_file.file, filepath)
+    return f"/static/images/{local_filename}"
 
 # --- Security Protocol ---
 async def get_current_user(request: Request):
-    """Verifies the transient session cookie."""
+    """Verifies the signed, time-limited session cookie."""
     user_session = request.cookies.get("admin_session")
-    if user_session != "authenticated":
+    if not user_session:
+        raise HTTPException(status_code=401)
+    try:
+        _session_signer.unsign(user_session, max_age=SESSION_MAX_AGE)
+    except BadSignature:  # also covers SignatureExpired
         raise HTTPException(status_code=401)
     return True
 
@@ -43,9 +158,12 @@ async def login_page(request: Request):
 
 @router.post("/login")
 async def login(response: Response, password: str = Form(...)):
-    if password == ADMIN_PWD:
+    if hmac.compare_digest(password.encode(), ADMIN_PWD.encode()):
         response = RedirectResponse(url="/admin/dashboard", status_code=303)
-        response.set_cookie(key="admin_session", value="authenticated", httponly=True, samesite="lax")
+        response.set_cookie(
+            key="admin_session", value=_session_signer.sign(b"admin").decode(),
+            max_age=SESSION_MAX_AGE, httponly=True, samesite="lax"
+        )
         return response
     return RedirectResponse(url="/admin/login?error=InvalidPassword", status_code=303)
 
@@ -57,31 +175,29 @@ async def logout():
 
 # --- Dashboard & Management ---
 @router.get("/dashboard")
-async def admin_dashboard(request: Request):
+async def admin_dashboard(
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
     try:
         await get_current_user(request)
     except HTTPException:
         return RedirectResponse(url="/admin/login")
         
-    sites = []
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            try: sites = json.load(f)
-            except: sites = []
-
-    registered_users = []
-    if os.path.exists(USER_PATH):
-        with open(USER_PATH, "r", encoding="utf-8") as f:
-            try: registered_users = json.load(f)
-            except: registered_users = []
-
-    enquiries = get_all_enquiries()
+    try: sites = await run_in_threadpool(sites_cache.get_sites)
+    except ValueError: sites = []
+
+    registered_users = await run_in_threadpool(get_all_users)
+    enquiries = await run_in_threadpool(get_all_enquiries, limit, offset)
                 
     return templates.TemplateResponse("admin_panel.html", {
         "request": request, 
         "sites": sites, 
         "registered_users": registered_users,
-        "enquiries": enquiries
+        "enquiries": enquiries,
+        "enquiry_limit": limit,
+        "enquiry_offset": offset
     })
 
 # --- Identity Vault Actions ---
@@ -89,42 +205,20 @@ async def admin_dashboard(request: Request):
 @router.post("/log-user")
 async def log_user(name: str = Form(...), email: str = Form(...), phone: str = Form(...)):
     """Bridge for the frontend registry to record traveler contact data."""
-    try:
-        users = []
-        if os.path.exists(USER_PATH):
-            with open(USER_PATH, "r", encoding="utf-8") as f:
-                try: users = json.load(f)
-                except: users = []
-        
-        users.append({
-            "name": name, 
-            "email": email, 
-            "phone": phone, 
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-        })
-            
-        with open(USER_PATH, "w", encoding="utf-8") as f:
-            json.dump(users, f, indent=4)
+    if await run_in_threadpool(save_user, name, email, phone):
         return {"status": "success"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    return {"status": "error", "message": "Identity Vault Persistence Failure"}
 
 @router.post("/delete-user/{username}")
 async def delete_user(request: Request, username: str):
     await get_current_user(request)
-    if os.path.exists(USER_PATH):
-        with open(USER_PATH, "r", encoding="utf-8") as f:
-            users = json.load(f)
-        users = [u for u in users if u.get("name") != username]
-        with open(USER_PATH, "w", encoding="utf-8") as f:
-            json.dump(users, f, indent=4)
+    await run_in_threadpool(remove_user, username)
     return RedirectResponse(url="/admin/dashboard", status_code=303)
 
 @router.post("/clear-all-users")
 async def clear_all_users(request: Request):
     await get_current_user(request)
-    with open(USER_PATH, "w", encoding="utf-8") as f:
-        json.dump([], f)
+    await run_in_threadpool(clear_users)
     return RedirectResponse(url="/admin/dashboard", status_code=303)
 
 # --- Heritage Vault Actions (CRUD) ---
@@ -137,11 +231,7 @@ async def add_site_page(request: Request):
 @router.get("/edit/{site_id}", response_class=HTMLResponse)
 async def edit_site_page(request: Request, site_id: str):
     await get_current_user(request)
-    site_to_edit = None
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            sites = json.load(f)
-            site_to_edit = next((s for s in sites if s.get("id") == site_id), None)
+    site_to_edit = await run_in_threadpool(sites_cache.get_site, site_id)
     
     if not site_to_edit:
         return RedirectResponse(url="/admin/dashboard?error=NotFound")
@@ -165,29 +255,18 @@ async def add_site(
     
     final_image_path = image_url
     if image_file and image_file.filename:
-        ext = os.path.splitext(image_file.filename)[1]
-        local_filename = f"{name.lower().replace(' ', '_')}{ext}"
-        filepath = os.path.join(UPLOAD_DIR, local_filename)
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(image_file.file, buffer)
-        final_image_path = f"/static/images/{local_filename}"
-
-    sites = []
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            try: sites = json.load(f)
-            except: sites = []
-    
-    sites.append({
-        "id": name.lower().replace(" ", "-"), "name": name, "category": category,
+        final_image_path = await _save_image(image_file, name)
+
+    new_site = {
+        "id": _slug(name), "name": name, "category": category,
         "district": district, "image_url": final_image_path,
         "gallery": [u.strip() for u in gallery_urls.split(",") if u.strip()],
         "video_url": video_url, "history_text": history_text, "culture": culture,
         "coordinates": {"lat": lat, "lng": lng}
-    })
-    
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(sites, f, indent=4)
+    }
+
+    async with _sites_write_lock:
+        await run_in_threadpool(_edit_sites, lambda sites: sites + [new_site], True)
     return RedirectResponse(url="/admin/dashboard", status_code=303)
 
 @router.post("/update-site/{old_id}")
@@ -201,21 +280,16 @@ async def update_site(
 ):
     await get_current_user(request)
     
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            sites = json.load(f)
-        
+    # The upload is stored before taking the vault lock, never while holding it
+    new_image = image_url
+    if image_file and image_file.filename:
+        new_image = await _save_image(image_file, name)
+
+    def edit(sites):
         for s in sites:
             if s["id"] == old_id:
-                if image_file and image_file.filename:
-                    ext = os.path.splitext(image_file.filename)[1]
-                    local_filename = f"{name.lower().replace(' ', '_')}{ext}"
-                    filepath = os.path.join(UPLOAD_DIR, local_filename)
-                    with open(filepath, "wb") as buffer:
-                        shutil.copyfileobj(image_file.file, buffer)
-                    s["image_url"] = f"/static/images/{local_filename}"
-                elif image_url:
-                    s["image_url"] = image_url
+                if new_image:
+                    s["image_url"] = new_image
 
                 s.update({
                     "name": name, "category": category, "district": district,
@@ -224,19 +298,18 @@ async def update_site(
                     "gallery": [u.strip() for u in gallery_urls.split(",") if u.strip()],
                     "coordinates": {"lat": lat, "lng": lng}
                 })
-        
-        with open(DATA_PATH, "w", encoding="utf-8") as f:
-            json.dump(sites, f, indent=4)
+        return sites
+
+    async with _sites_write_lock:
+        await run_in_threadpool(_edit_sites, edit)
             
     return RedirectResponse(url="/admin/dashboard", status_code=303)
 
 @router.post("/delete/{site_id}")
 async def delete_site(request: Request, site_id: str):
     await get_current_user(request)
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            sites = json.load(f)
-        sites = [s for s in sites if s.get("id") != site_id]
-        with open(DATA_PATH, "w", encoding="utf-8") as f:
-            json.dump(sites, f, indent=4)
+    async with _sites_write_lock:
+        await run_in_threadpool(
+            _edit_sites, lambda sites: [s for s in sites if s.get("id") != site_id]
+        )
     return RedirectResponse(url="/admin/dashboard", status_code=303)
\ No newline at end of file
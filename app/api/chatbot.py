@@ -1,11 +1,14 @@
 import os
 import uuid
+import hashlib
 import asyncio
 import edge_tts
 import logging
 from fastapi import APIRouter, Request, Query, HTTPException, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
 from app.services.ai_engine import ai_guide
 
 # Configure Logging for Production Monitoring
@@ -17,6 +20,29 @@ router = APIRouter(prefix="/chatbot", tags=["Oracle"])
 # Directory configuration for ephemeral audio files
 AUDIO_DIR = "static/audio"
 os.makedirs(AUDIO_DIR, exist_ok=True)
+# Size cap for the clip cache; the maintenance route evicts least-recently-played clips above it
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Upstream Backpressure: cap in-flight Gemini / edge-tts calls per worker and
+# shed load with HTTP 429 instead of letting the wait queue grow without bound
+_LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONC", "8")))
+_TTS_SEM = asyncio.Semaphore(int(os.getenv("TTS_MAX_CONC", "16")))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "30"))
+
+class UpstreamBusy(Exception):
+    """Raised when no upstream slot frees up within UPSTREAM_QUEUE_TIMEOUT."""
+
+@asynccontextmanager
+async def _upstream_slot(sem):
+    try:
+        async with asyncio.timeout(UPSTREAM_QUEUE_TIMEOUT):
+            await sem.acquire()
+    except TimeoutError:
+        raise UpstreamBusy() from None
+    try:
+        yield
+    finally:
+        sem.release()
 
 # 1. Identity & Context Schema
 class ChatQuery(BaseModel):
@@ -34,18 +60,25 @@ async def ask_oracle(data: ChatQuery):
     """
     try:
         # Pass the request to the AI Engine (Gemini 1.5 Node)
-        response_text = ai_guide.get_answer(
-            user_query=data.query, 
-            site_id=data.site_id, 
-            lang=data.lang,
-            username=data.username
-        )
+        async with _upstream_slot(_LLM_SEM):
+            response_text = await ai_guide.get_answer(
+                user_query=data.query, 
+                site_id=data.site_id, 
+                lang=data.lang,
+                username=data.username
+            )
         
         return {
             "status": "success", 
             "response": response_text
         }
     
+    except UpstreamBusy:
+        logger.warning("Oracle Saturated: LLM slot wait timed out")
+        return ORJSONResponse(status_code=429, content={
+            "status": "busy",
+            "response": f"Vanakkam {data.username}. The Oracle is attending to many travelers right now. Please ask again in a moment."
+        })
     except Exception as e:
         logger.error(f"Oracle Sync Failure: {e}")
         # Immersion-safe error message
@@ -70,16 +103,31 @@ async def voice_guide(text: str = Query(...), lang: str = "en"):
         if not clean_text:
             raise HTTPException(status_code=400, detail="Text payload empty")
 
-        # Generate unique hash-based filename to prevent disk collisions
-        filename = f"oracle_{uuid.uuid4().hex[:8]}.mp3"
+        # Content-addressed filename: the same narration always maps to the same clip
+        key = hashlib.blake2b(f"{voice}\0{clean_text}".encode("utf-8"), digest_size=8).hexdigest()
+        filename = f"oracle_{key}.mp3"
         filepath = os.path.join(AUDIO_DIR, filename)
 
-        # Execute Edge-TTS Communication
+        # Replays skip the TTS round-trip; bump the timestamps so cleanup treats the clip as fresh
+        if os.path.exists(filepath):
+            os.utime(filepath)
+            return {"audio_url": f"/static/audio/{filename}"}
+
+        # Execute Edge-TTS Communication (into a temp file so a failed or concurrent
+        # synthesis never leaves a truncated clip under the cached name)
+        tmp_path = f"{filepath}.{uuid.uuid4().hex[:8]}.part"
         try:
-            communicate = edge_tts.Communicate(clean_text, voice)
-            await communicate.save(filepath)
+            async with _upstream_slot(_TTS_SEM):
+                communicate = edge_tts.Communicate(clean_text, voice)
+                await communicate.save(tmp_path)
+            os.replace(tmp_path, filepath)
+        except UpstreamBusy:
+            logger.warning("Voice Node Saturated: TTS slot wait timed out")
+            return ORJSONResponse(status_code=429, content={"error": "Voice Node Busy"})
         except Exception as tts_err:
             logger.error(f"TTS Engine Error: {tts_err}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return {"error": "Voice Node Offline", "details": str(tts_err)}
 
         # Verify Disk Write
@@ -98,13 +146,30 @@ async def clear_audio_cache(background_tasks: BackgroundTasks):
     """
     Admin-only cleanup route. Uses BackgroundTasks to prevent 
     blocking the main thread during high-file count deletions.
+    Evicts the least-recently-played clips until the cache fits AUDIO_CACHE_MAX_MB.
     """
     def purge_files():
+        clips = []
+        with os.scandir(AUDIO_DIR) as it:
+            for e in it:
+                if e.name.endswith(".mp3") and e.is_file():
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        continue  # Removed by a concurrent sweep
+                    clips.append((st.st_atime, st.st_size, e.path))
+
+        total = sum(size for _, size, _ in clips)
         purged = 0
-        for f in os.listdir(AUDIO_DIR):
-            if f.endswith(".mp3"):
-                os.remove(os.path.join(AUDIO_DIR, f))
+        for _, size, path in sorted(clips):
+            if total <= AUDIO_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
                 purged += 1
+            except FileNotFoundError:
+                pass  # Another worker's sweep got there first; the space is freed either way
+            total -= size
         logger.info(f"Storage Maintenance: Purged {purged} audio logs.")
 
     background_tasks.add_task(purge_files)
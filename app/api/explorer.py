@@ -1,15 +1,12 @@
-import os
-import json
 from fastapi import APIRouter, Request, Query
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, Response
+from app.data import _json
+from app.services import sites_cache
+from app.templating import templates
 
 # Initialize the router with consistent tags for the Admin Dashboard
 router = APIRouter(prefix="/explorer", tags=["Explorer"])
-templates = Jinja2Templates(directory="templates")
-
-# Path to the Inkwake Digital Archives
-DATA_PATH = "app/data/sites_info.json"
 
 @router.get("/", response_class=HTMLResponse)
 async def explorer_home(
@@ -21,40 +18,32 @@ async def explorer_home(
     Renders the Heritage Circuits explorer. 
     Supports dynamic filtering by Dynasty and backend-ready search queries.
     """
-    all_sites = []
     categories = []
     active_filter = dynasty if dynasty else "All"
 
     try:
-        # 1. Load the Heritage Scrolls (JSON Database)
-        if os.path.exists(DATA_PATH):
-            with open(DATA_PATH, "r", encoding="utf-8") as f:
-                all_sites = json.load(f)
+        # 1. Load the Heritage Scrolls (cached index, rebuilt only when the JSON changes)
+        index = await run_in_threadpool(sites_cache.get_index)
         
-        # 2. Extract Unique Dynasties for the Filter Navigation
-        # Using sorted(set()) ensures buttons are alphabetical and unique
-        categories = sorted(list(set(
-            site.get("category") for site in all_sites if site.get("category")
-        )))
+        # 2. Unique Dynasties for the Filter Navigation (sorted once at index build)
+        categories = index.categories
 
-        # 3. Apply Dynasty Filter Logic
+        # 3. Apply Dynasty Filter Logic via the per-dynasty buckets
         if dynasty and dynasty != "All":
-            filtered_sites = [
-                s for s in all_sites 
-                if s.get("category", "").lower() == dynasty.lower()
-            ]
+            entries = index.by_category.get(dynasty.lower(), [])
         else:
-            filtered_sites = all_sites
+            entries = index.entries
 
         # 4. Optional: Backend Search Integration
         # While the frontend has instant search, this handles direct URL queries
         if search:
             query = search.lower()
             filtered_sites = [
-                s for s in filtered_sites 
-                if query in s.get("name", "").lower() or 
-                   query in s.get("district", "").lower()
+                s for s, name_lc, district_lc in entries
+                if query in name_lc or query in district_lc
             ]
+        else:
+            filtered_sites = [s for s, _, _ in entries]
 
     except Exception as e:
         print(f"Digital Archive Access Error: {e}")
@@ -73,7 +62,6 @@ async def explorer_home(
 @router.get("/api/sites")
 async def get_sites_json():
     """Helper API endpoint for dynamic map updates or external integrations."""
-    if os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
\ No newline at end of file
+    data = await run_in_threadpool(sites_cache.get_sites)
+    # Pre-encoded body: skips FastAPI's jsonable_encoder + stdlib re-encode
+    return Response(_json.dumps(data), media_type="application/json")
\ No newline at end of file
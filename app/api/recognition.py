@@ -1,13 +1,35 @@
-import json
 import os
+import mmap
+import contextlib
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.services import sites_cache
 from app.services.vision_engine import identify_landmark
 
 # 1. Initialize the router with protocol-specific tags
 router = APIRouter(prefix="/recognition", tags=["Recognition"])
 
-# Path to ensure the site actually exists in the database after being identified by CV
-DATA_PATH = "app/data/sites_info.json"
+def _identify_upload(spool):
+    """
+    Feeds the upload's SpooledTemporaryFile to the Vision Engine without an
+    intermediate bytes copy: disk-backed spools are memory-mapped, in-memory
+    spools expose their BytesIO buffer directly.
+    """
+    if getattr(spool, "_rolled", True):
+        spool.flush()
+        if os.fstat(spool.fileno()).st_size == 0:
+            return None
+        mm = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return identify_landmark(mm)
+        finally:
+            # A traceback frame may still hold the engine's buffer export; the
+            # mapping is then released with it, and the real error propagates
+            with contextlib.suppress(BufferError):
+                mm.close()
+
+    with spool._file.getbuffer() as view:
+        return identify_landmark(view) if view.nbytes else None
 
 @router.post("/scan")
 async def scan_monument(file: UploadFile = File(...)):
@@ -16,11 +38,8 @@ async def scan_monument(file: UploadFile = File(...)):
     the OpenCV Vision Engine, and returns a verified Site ID.
     """
     try:
-        # 1. Read binary image data
-        contents = await file.read()
-        
-        # 2. Invoke OpenCV ORB/FLANN Feature Matching
-        site_id = identify_landmark(contents)
+        # 1 & 2. Hand the uploaded image buffer to OpenCV ORB/FLANN Feature Matching
+        site_id = await run_in_threadpool(_identify_upload, file.file)
         
         if not site_id:
             return {
@@ -29,17 +48,12 @@ async def scan_monument(file: UploadFile = File(...)):
             }
 
         # 3. Cross-reference with JSON Database to ensure site data exists
-        if os.path.exists(DATA_PATH):
-            with open(DATA_PATH, "r", encoding="utf-8") as f:
-                sites = json.load(f)
-                site_exists = any(s.get("id") == site_id for s in sites)
-                
-                if not site_exists:
-                    return {
-                        "status": "partial_match",
-                        "message": f"Landmark identified as {site_id}, but the digital scroll is not yet published.",
-                        "site_id": site_id
-                    }
+        if await run_in_threadpool(sites_cache.get_site, site_id) is None:
+            return {
+                "status": "partial_match",
+                "message": f"Landmark identified as {site_id}, but the digital scroll is not yet published.",
+                "site_id": site_id
+            }
 
         # 4. Successful Identification
         return {
@@ -59,7 +73,8 @@ async def get_scanner_status():
     ref_dir = "static/reference_monuments/"
     
     if os.path.exists(ref_dir):
-        reference_count = len([f for f in os.listdir(ref_dir) if f.endswith(('.jpg', '.png'))])
+        with os.scandir(ref_dir) as it:
+            reference_count = sum(1 for e in it if e.is_file() and e.name.endswith(('.jpg', '.png')))
         
     return {
         "node": "Inkwake Vision v2.5",
@@ -0,0 +1,25 @@
+"""
+JSON codec shared by the Inkwake JSON vaults (sites_info.json).
+Uses orjson when available and falls back to the stdlib json module.
+"""
+try:
+    import orjson
+
+    def loads(data):
+        """Parses bytes, bytearray, memoryview or str into Python objects."""
+        return orjson.loads(data)
+
+    def dumps(obj, indent=False):
+        """Serializes to UTF-8 bytes. `indent` keeps the on-disk vaults readable."""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+except ImportError:
+    import json
+
+    def loads(data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(obj, indent=False):
+        return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode("utf-8")
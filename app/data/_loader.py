@@ -0,0 +1,35 @@
+"""
+Read path for the Inkwake JSON vaults.
+Files are memory-mapped and handed straight to the parser, so the kernel
+serves pages from its cache instead of copying them into a Python buffer.
+"""
+import mmap
+import os
+
+from app.data import _json
+
+DATA_PATH = "app/data/sites_info.json"
+
+
+def load_json(path, default=None):
+    """Parses a JSON vault via mmap. Missing or empty files yield `default`."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [] if default is None else default
+
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap refuses zero-length mappings
+            return [] if default is None else default
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with memoryview(mm) as view:
+                return _json.loads(view)
+        finally:
+            mm.close()
+
+
+def load_sites():
+    """Returns the heritage site list from sites_info.json."""
+    return load_json(DATA_PATH)
@@ -0,0 +1,29 @@
+"""
+Write path for the Inkwake JSON vaults.
+The document is serialized once, written to a sibling temp file with raw
+os.write calls, fsynced, then swapped in with os.replace so readers never
+observe a half-written vault.
+"""
+import os
+import threading
+
+from app.data import _json
+
+
+def atomic_write_json(path, obj):
+    """Atomically replaces `path` with the indented JSON encoding of `obj`."""
+    payload = memoryview(_json.dumps(obj, indent=True))
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while payload:
+            written = os.write(fd, payload)
+            payload = payload[written:]
+        os.fsync(fd)
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp_path)
+        raise
+    os.close(fd)
+    os.replace(tmp_path, path)
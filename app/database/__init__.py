@@ -1,2 +1,14 @@
 # app/database/__init__.py
-from .database import get_all_enquiries, log_security_event, save_enquiry
\ No newline at end of file
+from .database import (
+    SECURITY_BATCH_SIZE,
+    clear_users,
+    close_connections,
+    flush_security_events,
+    get_all_enquiries,
+    get_all_users,
+    import_users,
+    log_security_event,
+    remove_user,
+    save_enquiry,
+    save_user,
+)
\ No newline at end of file
@@ -1,8 +1,13 @@
 import sqlite3
 import os
+import atexit
+import logging
+import threading
+from collections import deque
 from datetime import datetime
 
 DB_PATH = 'app/data/security.db'
+logger = logging.getLogger("InkwakeVault")
 
 def init_db():
     """Initializes the SQLite database and creates the necessary heritage vaults."""
@@ -10,6 +15,9 @@ def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     
     with sqlite3.connect(DB_PATH) as conn:
+        # WAL lets readers proceed while a registration/log write is in flight
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
         cursor = conn.cursor()
         
         # 1. Security Archive: For monitoring unauthorized access or sensitive triggers
@@ -27,9 +35,16 @@ def init_db():
             CREATE TABLE IF NOT EXISTS registered_users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
+                email TEXT,
+                phone TEXT,
                 timestamp TEXT NOT NULL
             )
         ''')
+        # Vaults created before contact details were stored need the new columns
+        user_columns = {row[1] for row in cursor.execute("PRAGMA table_info(registered_users)")}
+        for column in ("email", "phone"):
+            if column not in user_columns:
+                cursor.execute(f"ALTER TABLE registered_users ADD COLUMN {column} TEXT")
         
         # 3. Lead Vault: For storing curator enquiries (from the Enquiry Page)
         cursor.execute('''
@@ -43,48 +58,210 @@ def init_db():
                 timestamp TEXT NOT NULL
             )
         ''')
+
+        # 4. Timestamp indexes so the dashboard's ORDER BY is an index scan, not a sort
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_enq_ts ON enquiries(timestamp DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sec_ts ON security_logs(timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_ts ON registered_users(timestamp DESC)")
         conn.commit()
 
+# --- Connection Pool ---
+# One long-lived connection per thread (event loop + threadpool workers),
+# opened lazily in autocommit mode so each statement is its own transaction.
+# Writes from this process are serialized on _write_lock; WAL permits a single
+# writer anyway, and queuing here avoids SQLite's busy-retry sleeps.
+BUSY_TIMEOUT_MS = 5000
+_local = threading.local()
+_pool = []
+_pool_lock = threading.Lock()
+_write_lock = threading.Lock()
+_generation = 0
+
+def _conn():
+    """Returns this thread's cached vault connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # synchronous and busy_timeout are per-connection settings
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        with _pool_lock:
+            _pool.append(conn)
+        _local.conn = conn
+        _local.generation = _generation
+    return conn
+
+def close_connections():
+    """Closes every pooled connection; called from the app shutdown handler."""
+    global _generation
+    with _pool_lock:
+        _generation += 1
+        while _pool:
+            try:
+                _pool.pop().close()
+            except sqlite3.Error:
+                pass
+
+# --- Security Event Buffer ---
+# Events are queued in memory and written in batches by flush_security_events(),
+# so one commit (and fsync) covers many rows instead of one per request.
+# During a DB outage failed batches are requeued; past SECURITY_BUFFER_MAX the
+# oldest rows are dropped (and counted) so the backlog cannot exhaust memory.
+SECURITY_BATCH_SIZE = 500
+SECURITY_BUFFER_MAX = 100 * SECURITY_BATCH_SIZE
+_pending = deque()
+_flush_lock = threading.Lock()
+_write_failing = False  # logs an outage once, not on every flush tick
+
+def _trim_pending():
+    """Drops the oldest buffered events beyond SECURITY_BUFFER_MAX. Caller holds _flush_lock."""
+    dropped = 0
+    while len(_pending) > SECURITY_BUFFER_MAX:
+        _pending.popleft()
+        dropped += 1
+    if dropped:
+        logger.warning(f"Security Archive Backlog Full: dropped {dropped} oldest events")
+
 def log_security_event(ip_address, action):
-    """Bridge for main.py to record security protocols."""
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute(
-                "INSERT INTO security_logs (ip, action, timestamp) VALUES (?, ?, ?)",
-                (ip_address, action, timestamp)
-            )
-            conn.commit()
-    except Exception as e:
-        print(f"⚠️ Security Archive Error: {e}")
+    """Bridge for main.py to record security protocols (buffered). Returns the backlog size."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _pending.append((ip_address, action, timestamp))
+    return len(_pending)
+
+def flush_security_events(limit=SECURITY_BATCH_SIZE):
+    """
+    Writes up to `limit` buffered events (all of them if None). Returns the row
+    count; on a failed write the batch goes back into the buffer and 0 is returned.
+    """
+    global _write_failing
+    with _flush_lock:
+        _trim_pending()
+        batch = []
+        while _pending and (limit is None or len(batch) < limit):
+            batch.append(_pending.popleft())
+        if not batch:
+            return 0
+        try:
+            conn = _conn()
+            with _write_lock:
+                conn.execute("BEGIN")
+                try:
+                    conn.executemany(
+                        "INSERT INTO security_logs (ip, action, timestamp) VALUES (?, ?, ?)",
+                        batch
+                    )
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+        except Exception as e:
+            # Requeue at the front, in order, so the next flush retries these rows
+            _pending.extendleft(reversed(batch))
+            _trim_pending()
+            if not _write_failing:
+                _write_failing = True
+                logger.error(f"Security Archive Error (events buffered for retry): {e}")
+            return 0
+        if _write_failing:
+            _write_failing = False
+            logger.info(f"Security Archive Recovered: {len(_pending)} events still buffered")
+        return len(batch)
 
 def save_enquiry(name, email, subject, message):
     """Bridge for the Curator Enquiry route to store traveler messages."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute(
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with _write_lock:
+            _conn().execute(
                 "INSERT INTO enquiries (name, email, subject, message, timestamp) VALUES (?, ?, ?, ?, ?)",
                 (name, email, subject, message, timestamp)
             )
-            conn.commit()
-            return True
+        return True
     except Exception as e:
         print(f"⚠️ Lead Vault Error: {e}")
         return False
 
-def get_all_enquiries():
-    """Fetches enquiries for the Admin Dashboard Command Center."""
+def save_user(name, email, phone):
+    """Bridge for the traveler registry to store identity records."""
+    try:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with _write_lock:
+            _conn().execute(
+                "INSERT INTO registered_users (name, email, phone, timestamp) VALUES (?, ?, ?, ?)",
+                (name, email, phone, timestamp)
+            )
+        return True
+    except Exception as e:
+        print(f"⚠️ Identity Vault Error: {e}")
+        return False
+
+def import_users(users):
+    """Bulk-loads legacy users_info.json records into the Identity Vault."""
+    rows = [
+        (u.get("name", ""), u.get("email"), u.get("phone"),
+         u.get("timestamp") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        for u in users
+    ]
+    conn = _conn()
+    with _write_lock:
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO registered_users (name, email, phone, timestamp) VALUES (?, ?, ?, ?)",
+                rows
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+def get_all_users():
+    """Fetches registered travelers for the Admin Dashboard Identity Vault."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row  # Enables dictionary-style access in Jinja2
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM enquiries ORDER BY timestamp DESC")
-            return [dict(row) for row in cursor.fetchall()]
+        cursor = _conn().cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute("SELECT * FROM registered_users ORDER BY timestamp DESC")
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception:
+        return []
+
+def remove_user(name):
+    """Removes every identity record registered under `name`."""
+    try:
+        with _write_lock:
+            _conn().execute("DELETE FROM registered_users WHERE name = ?", (name,))
+        return True
+    except Exception as e:
+        print(f"⚠️ Identity Vault Error: {e}")
+        return False
+
+def clear_users():
+    """Wipes the Identity Vault."""
+    try:
+        with _write_lock:
+            _conn().execute("DELETE FROM registered_users")
+        return True
+    except Exception as e:
+        print(f"⚠️ Identity Vault Error: {e}")
+        return False
+
+def get_all_enquiries(limit=100, offset=0):
+    """Fetches one page of enquiries (newest first) for the Admin Dashboard Command Center."""
+    try:
+        cursor = _conn().cursor()
+        cursor.row_factory = sqlite3.Row  # Enables dictionary-style access in Jinja2
+        cursor.execute(
+            "SELECT id, name, email, subject, status, timestamp FROM enquiries "
+            "ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        )
+        return [dict(row) for row in cursor.fetchall()]
     except Exception:
         return []
 
 # Trigger vault initialization on module load
-init_db()
\ No newline at end of file
+init_db()
+
+# Never drop buffered events on interpreter exit
+atexit.register(flush_security_events, None)
\ No newline at end of file
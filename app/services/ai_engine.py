@@ -1,13 +1,35 @@
 import os
-import json
+import functools
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
 # Ensure you are only importing what is needed
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from app.services import sites_cache
 
 load_dotenv()
-# Force reload of .env to ensure the new API Key is captured
-load_dotenv()
+
+@functools.lru_cache(maxsize=1024)
+def _context_for(site_id, version):
+    """
+    Formats the RAG grounding string for one site (or the vault summary when
+    site_id is None/unknown). `version` is the sites index version and only
+    keys the cache, so edits to sites_info.json produce fresh strings.
+    """
+    index = sites_cache.get_index()
+    if not index.sites:
+        return "General knowledge of Chola, Pandya, and Pallava dynasties."
+
+    if site_id:
+        # Find specific monument facts
+        site = index.by_id.get(site_id)
+        if site:
+            return (f"Monument: {site['name']}. District: {site['district']}. "
+                    f"History: {site['history_text']}. Culture: {site.get('culture', '')}")
+
+    # Global context summary
+    all_names = [s.get("name") for s in index.sites]
+    return f"The Inkwake vault contains records for: {', '.join(all_names)}."
 
 class HeritageAIEngine:
     def __init__(self):
@@ -29,7 +51,10 @@ class HeritageAIEngine:
         else:
             print(f"✅ Inkwake Oracle Node: API Key detected (ends in ...{self.api_key[-4:]})")
 
+        # Both clients are built once so failover doesn't pay client construction
         self.llm = self._init_llm(self.primary_model)
+        self.fallback_llm = self._init_llm(self.fallback_model)
+        self._context_version = None
         
         # Ensure the data directory exists
         os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
@@ -55,36 +80,28 @@ class HeritageAIEngine:
     def _get_context(self, site_id=None):
         """ Retrieves historical facts from local JSON for RAG grounding. """
         try:
-            if not os.path.exists(self.data_path):
-                return "General knowledge of Chola, Pandya, and Pallava dynasties."
-
-            with open(self.data_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            
-            if site_id:
-                # Find specific monument facts
-                site = next((s for s in data if s.get("id") == site_id), None)
-                if site:
-                    return (f"Monument: {site['name']}. District: {site['district']}. "
-                            f"History: {site['history_text']}. Culture: {site.get('culture', '')}")
-            
-            # Global context summary
-            all_names = [s.get("name") for s in data]
-            return f"The Inkwake vault contains records for: {', '.join(all_names)}."
+            version = sites_cache.get_index().version
+            if version != self._context_version:
+                # Vault changed: strings for older versions can never be hit again
+                _context_for.cache_clear()
+                self._context_version = version
+            return _context_for(site_id, version)
             
         except Exception as e:
             print(f"⚠️ RAG Context Error: {e}")
             return "Expertise in Tamil Nadu Heritage and Dravidian architecture."
 
-    def get_answer(self, user_query, site_id=None, lang="en", username="Explorer"):
+    async def get_answer(self, user_query, site_id=None, lang="en", username="Explorer"):
         """
         Generates a factual response with failover logic.
+        Awaits the model call so the event loop keeps serving other travelers.
         """
         # If API key was missing during init
         if not self.llm:
             return "Error: API Key missing. Please configure your .env file."
 
-        context = self._get_context(site_id)
+        # A vault change means a re-parse; keep that file IO off the event loop
+        context = await run_in_threadpool(self._get_context, site_id)
         lang_instruction = "Tamil (தமிழ்)" if lang == "ta" else "English"
         
         system_instruction = f"""
@@ -107,7 +124,7 @@ class HeritageAIEngine:
 
         try:
             # Attempt 1: Flash Model
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             return response.content
         except Exception as e:
             # This print will show the specific API error in your terminal
@@ -115,9 +132,8 @@ class HeritageAIEngine:
             
             # Attempt 2: Failover to Pro Model
             try:
-                print(f"🔄 Failover: Initializing {self.fallback_model}...")
-                fallback_llm = self._init_llm(self.fallback_model)
-                response = fallback_llm.invoke(messages)
+                print(f"🔄 Failover: Routing to {self.fallback_model}...")
+                response = await self.fallback_llm.ainvoke(messages)
                 return response.content
             except Exception as fe:
                 print(f"❌ Critical System Failure: {fe}")
@@ -0,0 +1,75 @@
+import os
+import threading
+
+from app.data._loader import DATA_PATH, load_sites
+
+
+class SitesIndex:
+    """Parsed snapshot of sites_info.json plus the lookup tables built from it."""
+
+    def __init__(self, version, sites):
+        self.version = version  # (st_ino, st_mtime_ns, st_size) of the file it was parsed from
+        self.sites = sites
+        self.by_id = {s.get("id"): s for s in sites}
+
+        # Explorer filter tables: (site, name_lc, district_lc) search entries,
+        # bucketed by lowercased dynasty, plus the sorted dynasty list.
+        self.entries = [
+            (s, s.get("name", "").lower(), s.get("district", "").lower()) for s in sites
+        ]
+        self.by_category = {}
+        for entry in self.entries:
+            category = entry[0].get("category")
+            if category:
+                self.by_category.setdefault(category.lower(), []).append(entry)
+        self.categories = sorted({s["category"] for s in sites if s.get("category")})
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _file_version():
+    try:
+        st = os.stat(DATA_PATH)
+    except FileNotFoundError:
+        return None
+    # atomic_write_json swaps in a new inode, so st_ino changes on every write
+    # even when a same-size edit lands within one mtime tick
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def get_index():
+    """
+    Returns the current SitesIndex, re-parsing the vault only when its
+    inode/mtime/size changed. The returned objects are shared: treat them as read-only.
+    """
+    global _index
+    version = _file_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _lock:
+        if _index is not None and _index.version == version:
+            return _index
+        sites = load_sites() if version is not None else []
+        _index = SitesIndex(version, sites)
+        return _index
+
+
+def get_sites():
+    """Cached list of all heritage sites (read-only)."""
+    return get_index().sites
+
+
+def get_site(site_id):
+    """O(1) lookup of a single site record by id, or None."""
+    return get_index().by_id.get(site_id)
+
+
+def invalidate():
+    """Drops the cached snapshot; call after rewriting sites_info.json."""
+    global _index
+    with _lock:
+        _index = None
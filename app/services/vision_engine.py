@@ -1,89 +1,331 @@
 import cv2
 import os
+import queue
+import threading
 import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.services import vision_index, vision_kernels, vision_matchers
+
+# "flann": approximate LSH index (fastest on few cores).
+# "bf": exact brute-force Hamming (POPCNT, parallelised across cores); deterministic results.
+# "torch": exact Hamming as a ±1 matmul on the GPU (CPU if torch has no CUDA device),
+#          for hosts whose OpenCV lacks CUDA modules.
+# "hnsw": hnswlib graph search; flat latency as the library grows to 10^5+ descriptors.
+# "numpy": exact Hamming via uint64 XOR + popcount in NumPy; dependency-free fallback.
+MATCHER_BACKEND = os.getenv("VISION_MATCHER", "flann").lower()
+if (MATCHER_BACKEND == "torch" and vision_matchers.torch is None) or \
+        (MATCHER_BACKEND == "hnsw" and vision_matchers.hnswlib is None):
+    MATCHER_BACKEND = "flann"
+
+QUERY_MAX_EDGE = 800  # px; phone uploads are downscaled to this longest edge before detection
+MIN_VERIFIED_MATCHES = 20  # inliers required for a successful ID
+CONFIDENT_INLIERS = 60     # inliers at which remaining candidates are not worth verifying
+
+# BEBLID (opencv-contrib) re-describes ORB keypoints with a learned 256-bit
+# descriptor: same size and Hamming metric as ORB, higher inlier ratio.
+# VISION_DESCRIPTOR=orb keeps plain ORB descriptors.
+_BEBLID_CREATE = getattr(getattr(cv2, "xfeatures2d", None), "BEBLID_create", None)
+USE_BEBLID = _BEBLID_CREATE is not None and os.getenv("VISION_DESCRIPTOR", "beblid").lower() == "beblid"
+BEBLID_ORB_SCALE = 1.00  # sampling scale OpenCV documents for ORB keypoints
+
+def _cuda_available():
+    """True when OpenCV was built with CUDA features2d and a device is present."""
+    if os.getenv("VISION_CUDA", "1") == "0":
+        return False
+    cuda = getattr(cv2, "cuda", None)
+    if cuda is None or not hasattr(cuda, "ORB_create") or not hasattr(cuda, "DescriptorMatcher_createBFMatcher"):
+        return False
+    try:
+        return cuda.getCudaEnabledDeviceCount() > 0
+    except cv2.error:
+        return False
+
+# CUDA path: the descriptor bank stays resident on the GPU and is matched with
+# the CUDA brute-force Hamming matcher; plain-ORB deployments also detect on
+# the GPU. VISION_CUDA=0 forces the CPU path.
+USE_CUDA = _cuda_available()
+
+# Compute threads for this process: sizes the verify pool, the query detector
+# pool and OpenCV's (and torch's) internal pools. main.py splits the cores
+# between uvicorn workers so N workers do not run ~N^2 threads on N cores.
+VISION_THREADS = max(1, int(os.getenv("VISION_THREADS") or os.cpu_count() or 1))
+cv2.setNumThreads(VISION_THREADS)
+if MATCHER_BACKEND == "torch":
+    vision_matchers.torch.set_num_threads(VISION_THREADS)
+
+# Candidate verification pool: cv2.findHomography releases the GIL, so
+# candidates are verified in parallel across this process's threads.
+_verify_pool = ThreadPoolExecutor(max_workers=VISION_THREADS, thread_name_prefix="vision-verify")
+
+def _verify_candidate(ref, src_pts, dst_pts):
+    """Geometric verification of one candidate reference; returns (ref, inlier count)."""
+    # Find Homography (Geometric alignment) with MAGSAC++ (USAC framework)
+    _, mask = cv2.findHomography(
+        src_pts, dst_pts, cv2.USAC_MAGSAC, 5.0, maxIters=2000, confidence=0.995
+    )
+    return ref, 0 if mask is None else int(np.count_nonzero(mask))
+
+class _Redescribed:
+    """Detects keypoints with one extractor and describes them with another."""
+
+    def __init__(self, detector, descriptor):
+        self.detector = detector
+        self.descriptor = descriptor
+
+    def detectAndCompute(self, image, mask):
+        keypoints = self.detector.detect(image, mask)
+        if not keypoints:
+            return keypoints, None
+        return self.descriptor.compute(image, keypoints)
+
+class _CudaDetector:
+    """cv2.cuda ORB behind the CPU detectAndCompute interface. Descriptors stay on the device."""
+
+    def __init__(self, **params):
+        self.orb = cv2.cuda.ORB_create(**params)
+        self.stream = cv2.cuda.Stream()
+        self.image = cv2.cuda_GpuMat()
+
+    def detectAndCompute(self, image, mask):
+        self.image.upload(image, self.stream)
+        gpu_keypoints, gpu_descriptors = self.orb.detectAndComputeAsync(self.image, None, stream=self.stream)
+        self.stream.waitForCompletion()
+        keypoints = self.orb.convert(gpu_keypoints)
+        if not keypoints:
+            return keypoints, None
+        return keypoints, gpu_descriptors
 
 class VisionEngine:
     def __init__(self):
         # Initialize ORB: Oriented FAST and Rotated BRIEF
         # nfeatures=2000 allows for high-detail detection on complex Dravidian architecture
         self.orb = cv2.ORB_create(nfeatures=2000)
-        
+        self.signature = "orb:nfeatures=2000"
+
+        if USE_BEBLID:
+            self.orb = _Redescribed(self.orb, self._make_beblid())
+            self.signature += f"+beblid:scale={BEBLID_ORB_SCALE}:bits=256"
+
+        # OpenCV feature objects are not thread-safe: concurrent scans each
+        # borrow their own query detector from this pool.
+        self._query_detectors = queue.Queue()
+        for _ in range(VISION_THREADS):
+            self._query_detectors.put(self._make_query_detector())
+
         # FLANN parameters for ORB (using LSH index as ORB is binary)
-        index_params = dict(algorithm=6, table_number=6, key_size=12, multi_probe_level=1)
-        search_params = dict(checks=50)
-        
-        self.flann = cv2.FlannBasedMatcher(index_params, search_params)
-        self.reference_dir = "static/reference_monuments/"
-        
+        self.index_params = dict(algorithm=6, table_number=6, key_size=12, multi_probe_level=1)
+        self.search_params = dict(checks=50)
+
+        self.reference_dir = vision_index.REFERENCE_DIR
+
         if not os.path.exists(self.reference_dir):
             os.makedirs(self.reference_dir)
 
-    def process_and_match(self, query_img_bytes):
-        """Processes raw bytes and matches against reference library using geometric verification."""
-        # Convert bytes to OpenCV format
-        nparr = np.frombuffer(query_img_bytes, np.uint8)
+        # (ReferenceIndex, generation, bank) swapped as one unit on refresh; each
+        # thread trains its own matcher and rebuilds it when the generation moves on.
+        self._lock = threading.Lock()
+        self._state = None
+        self._generation = 0
+        self._local = threading.local()
+        self._dir_mtime = self._reference_dir_mtime()
+        self.refresh()
+        vision_kernels.warmup()
+
+    @staticmethod
+    def _make_beblid():
+        return _BEBLID_CREATE(BEBLID_ORB_SCALE, cv2.xfeatures2d.BEBLID_SIZE_256_BITS)
+
+    def _make_query_detector(self):
+        # Lighter detector for uploads: fewer features and pyramid levels bound
+        # worst-case latency. Scale differences are absorbed by the homography.
+        params = dict(nfeatures=1000, nlevels=6, fastThreshold=15)
+        if USE_CUDA and not USE_BEBLID:
+            # BEBLID has no CUDA implementation; with it, only matching runs on the GPU
+            return _CudaDetector(**params)
+        detector = cv2.ORB_create(**params)
+        if USE_BEBLID:
+            detector = _Redescribed(detector, self._make_beblid())
+        return detector
+
+    def refresh(self, manifest=None):
+        """Reloads (or rebuilds) the packed reference bank and retires every thread's matcher."""
+        with self._lock:
+            if manifest is not None and self._state and self._state[0].manifest == manifest:
+                return  # Another request already refreshed to this library state
+            index = vision_index.get_index(self.orb, self.signature, self.reference_dir)
+            bank = self._prepare_bank(index) if index.rows else None
+            self._generation += 1
+            self._state = (index, self._generation, bank)
+
+    def _thread_matcher(self, bank, generation):
+        """This thread's matcher over `bank`, trained on first use per generation."""
+        local = self._local
+        if getattr(local, "generation", None) != generation:
+            local.matcher = self._build_matcher(bank) if bank is not None else None
+            local.generation = generation
+        return local.matcher
+
+    @staticmethod
+    def _prepare_bank(index):
+        """
+        Backend-resident copy of the descriptor bank, built once per generation
+        and shared by every thread's matcher.
+        """
+        bank = np.asarray(index.descriptors)
+        if USE_CUDA:
+            gpu_bank = cv2.cuda_GpuMat()
+            gpu_bank.upload(bank)
+            return gpu_bank
+        if MATCHER_BACKEND == "torch":
+            return vision_matchers.torch_bank(bank)
+        if MATCHER_BACKEND == "hnsw":
+            cache_path = os.path.join(vision_index.INDEX_DIR, f"hnsw-{index.fingerprint}.bin")
+            return vision_matchers.hnsw_bank(bank, cache_path)
+        if MATCHER_BACKEND == "numpy":
+            return vision_matchers.numpy_bank(bank)
+        return bank
+
+    def _build_matcher(self, bank):
+        """Creates the configured knn2 matcher over the whole descriptor bank."""
+        if USE_CUDA:
+            matcher = cv2.cuda.DescriptorMatcher_createBFMatcher(cv2.NORM_HAMMING)
+            matcher.add([bank])
+            return vision_matchers.CvMatcher(matcher)
+        if MATCHER_BACKEND == "torch":
+            return vision_matchers.TorchHammingMatcher(bank)
+        if MATCHER_BACKEND == "hnsw":
+            return vision_matchers.HnswMatcher(bank)
+        if MATCHER_BACKEND == "numpy":
+            return vision_matchers.NumpyHammingMatcher(bank)
+        if MATCHER_BACKEND == "bf":
+            matcher = cv2.BFMatcher_create(cv2.NORM_HAMMING, crossCheck=False)
+        else:
+            matcher = cv2.FlannBasedMatcher(self.index_params, self.search_params)
+        matcher.add([bank])
+        matcher.train()
+        return vision_matchers.CvMatcher(matcher)
+
+    def _reference_dir_mtime(self):
+        try:
+            return os.stat(self.reference_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _current_state(self):
+        # One stat per request: the library is only rescanned when the directory's
+        # mtime moves (a reference was added, removed, renamed or replaced).
+        # Call refresh() after overwriting an image in place.
+        dir_mtime = self._reference_dir_mtime()
+        if dir_mtime != self._dir_mtime:
+            manifest = vision_index.scan_manifest(self.reference_dir)
+            if self._state[0].manifest != manifest:
+                self.refresh(manifest)
+            self._dir_mtime = dir_mtime
+        index, generation, bank = self._state
+        return index, self._thread_matcher(bank, generation)
+
+    def process_and_match(self, query_img_buffer):
+        """
+        Decodes an encoded image (bytes, memoryview or uint8 ndarray; used as a
+        zero-copy view) and matches it against the reference library using
+        geometric verification.
+        """
+        # Wrap the encoded buffer for OpenCV without copying it
+        nparr = np.frombuffer(query_img_buffer, np.uint8)
         query_img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+        # Drop the export now so a caller's mmap can close even if matching raises
+        del nparr
 
         if query_img is None:
             return None
 
-        kp_query, des_query = self.orb.detectAndCompute(query_img, None)
-        
+        h, w = query_img.shape[:2]
+        scale = QUERY_MAX_EDGE / max(h, w)
+        if scale < 1:
+            query_img = cv2.resize(query_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        detector = self._query_detectors.get()
+        try:
+            kp_query, des_query = detector.detectAndCompute(query_img, None)
+        finally:
+            self._query_detectors.put(detector)
+
         if des_query is None or len(kp_query) < 10:
             return None
 
-        best_match_id = None
-        max_verified_matches = 0
-
-        # Iterate through reference library
-        for filename in os.listdir(self.reference_dir):
-            if not filename.lower().endswith((".jpg", ".png", ".jpeg")):
-                continue
-            
-            ref_path = os.path.join(self.reference_dir, filename)
-            ref_img = cv2.imread(ref_path, cv2.IMREAD_GRAYSCALE)
-            
-            if ref_img is None:
-                continue
-
-            kp_ref, des_ref = self.orb.detectAndCompute(ref_img, None)
-            if des_ref is None or len(kp_ref) < 10:
-                continue
-
-            # KNN Matching
-            try:
-                matches = self.flann.knnMatch(des_query, des_ref, k=2)
-            except:
-                continue
-
-            # Lowe's Ratio Test to find high-quality matches
-            good_matches = []
-            for m, n in matches:
-                if m.distance < 0.75 * n.distance:
-                    good_matches.append(m)
-
-            # RANSAC Verification: Ensure the matched points form a valid geometric shape
-            if len(good_matches) > 15:
-                src_pts = np.float32([kp_query[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                dst_pts = np.float32([kp_ref[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-
-                # Find Homography (Geometric alignment)
-                _, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-                if mask is not None:
-                    verified_count = np.sum(mask)
-                    if verified_count > max_verified_matches:
-                        max_verified_matches = verified_count
-                        best_match_id = os.path.splitext(filename)[0]
-
-        # Threshold: Require at least 20 geometrically verified points for a successful ID
-        return best_match_id if max_verified_matches > 20 else None
+        index, matcher = self._current_state()
+        if matcher is None:
+            return None
+
+        # KNN Matching: one query against the whole reference bank, as arrays
+        try:
+            dists, q_idx, t_idx = matcher.knn2(des_query)
+        except cv2.error:
+            return None
+        if not len(dists):
+            return None
+
+        # Lowe's Ratio Test fused with the src/dst coordinate gather (one pass)
+        kp_query_pts = cv2.KeyPoint_convert(kp_query)  # float32[n, 2], filled in C++
+        src_all, dst_all, t_keep = vision_kernels.filter_and_gather(
+            dists, q_idx, t_idx, kp_query_pts, index.keypoints, 0.75
+        )
+
+        # Bucket the survivors by the reference image their trainIdx belongs to
+        refs = index.row_to_image[t_keep]
+        counts = np.bincount(refs, minlength=len(index.names))
+
+        # RANSAC Verification only for references with more than 15 ratio-test survivors,
+        # strongest first (PROSAC-style ordering) so the true match is usually verified first
+        candidate_refs = np.flatnonzero(counts > 15)
+        candidate_refs = candidate_refs[np.argsort(-counts[candidate_refs], kind="stable")]
+        candidates = []
+        for ref in candidate_refs.tolist():
+            sel = refs == ref
+            candidates.append((ref, src_all[sel].reshape(-1, 1, 2), dst_all[sel].reshape(-1, 1, 2)))
+
+        best_ref, max_verified_matches = self._verify(candidates)
+        best_match_id = index.names[best_ref] if best_ref is not None else None
+
+        # Threshold: Require more than 20 geometrically verified points for a successful ID
+        return best_match_id if max_verified_matches > MIN_VERIFIED_MATCHES else None
+
+    def _verify(self, candidates):
+        """
+        Verifies candidates (ordered strongest first) and returns the (ref, inliers)
+        with the most inliers. The strongest candidate is checked inline; the rest
+        only go to the shared pool if it was not unambiguous, and waiting stops as
+        soon as one result is.
+        """
+        if not candidates:
+            return None, 0
+
+        best = _verify_candidate(*candidates[0])
+        if best[1] >= CONFIDENT_INLIERS or len(candidates) == 1:
+            return best
+
+        pending = {_verify_pool.submit(_verify_candidate, *c) for c in candidates[1:]}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ref, verified_count = future.result()
+                    if verified_count > best[1]:
+                        best = (ref, verified_count)
+                if best[1] >= CONFIDENT_INLIERS:
+                    break  # Unambiguous match; skip the references still queued
+        finally:
+            for future in pending:
+                future.cancel()
+        return best
 
 # --- EXTERNAL FUNCTION FOR API IMPORT ---
 vision_service = VisionEngine()
 
-def identify_landmark(image_bytes: bytes):
+def identify_landmark(image_buffer):
     """
-    Called by app.api.recognition.
+    Called by app.api.recognition with any bytes-like view of the uploaded image.
     Returns the filename (id) of the matched monument.
     """
-    return vision_service.process_and_match(image_bytes)
\ No newline at end of file
+    return vision_service.process_and_match(image_buffer)
@@ -0,0 +1,202 @@
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+from app.data import _json
+
+REFERENCE_DIR = "static/reference_monuments/"
+INDEX_DIR = "app/data/vision_index"
+FEATURES_SUBDIR = "features"  # per-reference detectAndCompute results, one .npz per image
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+DESCRIPTOR_BYTES = 32  # ORB: 256-bit binary descriptors
+
+
+class ReferenceIndex:
+    """
+    Packed descriptor bank for the reference monument library (SoA layout).
+    Row i of `descriptors` / `keypoints` belongs to reference
+    `names[row_to_image[i]]`, i.e. offsets[r] <= i < offsets[r + 1].
+    """
+
+    def __init__(self, manifest, signature, names, offsets, descriptors, keypoints):
+        self.manifest = manifest        # [[filename, mtime_ns, size], ...] the bank was built from
+        self.signature = signature      # detector configuration the descriptors came from
+        self.names = names              # reference id (filename stem) per image
+        self.offsets = offsets          # row boundaries, len(names) + 1
+        self.descriptors = descriptors  # uint8[N, 32], memory-mapped read-only
+        self.keypoints = keypoints      # float32[N, 2] keypoint (x, y) per descriptor row
+        # int32[N] reference number per descriptor row (trainIdx -> image)
+        self.row_to_image = np.repeat(
+            np.arange(len(names), dtype=np.int32), np.diff(np.asarray(offsets, dtype=np.int64))
+        )
+
+    @property
+    def rows(self):
+        return len(self.descriptors)
+
+    @property
+    def fingerprint(self):
+        """Short hash identifying this exact bank (detector + library state)."""
+        return hashlib.blake2b(_json.dumps([self.signature, self.manifest]), digest_size=8).hexdigest()
+
+
+def scan_manifest(reference_dir=REFERENCE_DIR):
+    """Lists reference images as [filename, mtime_ns, size] entries, sorted by name."""
+    manifest = []
+    with os.scandir(reference_dir) as it:
+        for e in it:
+            if e.name.lower().endswith(IMAGE_EXTENSIONS) and e.is_file():
+                st = e.stat()
+                manifest.append([e.name, st.st_mtime_ns, st.st_size])
+    manifest.sort()
+    return manifest
+
+
+def _paths(index_dir):
+    return (
+        os.path.join(index_dir, "offsets.json"),
+        os.path.join(index_dir, "descriptors.bin"),
+        os.path.join(index_dir, "keypoints.bin"),
+    )
+
+
+def _write_array(path, array):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    np.ascontiguousarray(array).tofile(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _load_features(path, signature, mtime_ns, size):
+    """Returns cached (descriptors, points) for one reference, or None if stale/missing."""
+    try:
+        with np.load(path) as cached:
+            if (str(cached["signature"]) != signature
+                    or cached["stamp"].tolist() != [mtime_ns, size]):
+                return None
+            return cached["descriptors"], cached["points"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _detect_features(detector, image_path):
+    """Runs the detector on one reference image; (descriptors, points) or None."""
+    ref_img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if ref_img is None:
+        return None
+
+    kp_ref, des_ref = detector.detectAndCompute(ref_img, None)
+    if des_ref is None or len(kp_ref) < 10:
+        return None
+    return des_ref, cv2.KeyPoint_convert(kp_ref)
+
+
+def _save_features(path, signature, mtime_ns, size, features):
+    # Not *.npz, so a concurrent build_index never prunes it; np.savez only
+    # appends ".npz" to string paths, hence the open file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    descriptors, points = features
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f, signature=np.str_(signature), stamp=np.int64([mtime_ns, size]),
+            descriptors=descriptors, points=points
+        )
+    os.replace(tmp_path, path)
+
+
+def build_index(detector, signature, reference_dir=REFERENCE_DIR, index_dir=INDEX_DIR):
+    """
+    Packs every reference image's features into the persisted bank:
+    descriptors.bin, keypoints.bin and offsets.json. Per-image results are
+    cached under features/ keyed by filename + mtime/size, so only new or
+    modified references go through `detector.detectAndCompute`.
+    """
+    manifest = scan_manifest(reference_dir)
+    names, des_blocks, kp_blocks = [], [], []
+
+    features_dir = os.path.join(index_dir, FEATURES_SUBDIR)
+    os.makedirs(features_dir, exist_ok=True)
+
+    for filename, mtime_ns, size in manifest:
+        cache_path = os.path.join(features_dir, f"{filename}.npz")
+        features = _load_features(cache_path, signature, mtime_ns, size)
+        if features is None:
+            features = _detect_features(detector, os.path.join(reference_dir, filename))
+            if features is None:
+                continue
+            _save_features(cache_path, signature, mtime_ns, size, features)
+
+        names.append(os.path.splitext(filename)[0])
+        des_blocks.append(features[0])
+        kp_blocks.append(features[1])
+
+    # Forget references that were removed from the library. Only <image>.npz
+    # caches are candidates; another worker may be pruning the same files.
+    cached_names = {f"{filename}.npz" for filename, _, _ in manifest}
+    cache_suffixes = tuple(f"{ext}.npz" for ext in IMAGE_EXTENSIONS)
+    with os.scandir(features_dir) as it:
+        for e in it:
+            if e.name.lower().endswith(cache_suffixes) and e.name not in cached_names:
+                try:
+                    os.unlink(e.path)
+                except FileNotFoundError:
+                    pass
+
+    counts = [len(d) for d in des_blocks]
+    offsets = [0]
+    for count in counts:
+        offsets.append(offsets[-1] + count)
+
+    descriptors = np.vstack(des_blocks) if des_blocks else np.empty((0, DESCRIPTOR_BYTES), np.uint8)
+    keypoints = np.vstack(kp_blocks) if kp_blocks else np.empty((0, 2), np.float32)
+
+    os.makedirs(index_dir, exist_ok=True)
+    meta_path, des_path, kp_path = _paths(index_dir)
+    _write_array(des_path, descriptors)
+    _write_array(kp_path, keypoints)
+
+    # offsets.json is swapped in last: it is what marks the bank as complete
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_json.dumps({
+            "signature": signature,
+            "manifest": manifest,
+            "names": names,
+            "offsets": offsets,
+        }))
+    os.replace(tmp_path, meta_path)
+
+    return load_index(index_dir)
+
+
+def load_index(index_dir=INDEX_DIR):
+    """Memory-maps a persisted bank read-only. Returns None if none exists."""
+    meta_path, des_path, kp_path = _paths(index_dir)
+    try:
+        with open(meta_path, "rb") as f:
+            meta = _json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+    rows = meta["offsets"][-1]
+    if rows:
+        descriptors = np.memmap(des_path, dtype=np.uint8, mode="r", shape=(rows, DESCRIPTOR_BYTES))
+        keypoints = np.memmap(kp_path, dtype=np.float32, mode="r", shape=(rows, 2))
+    else:
+        # np.memmap cannot map empty files
+        descriptors = np.empty((0, DESCRIPTOR_BYTES), np.uint8)
+        keypoints = np.empty((0, 2), np.float32)
+
+    return ReferenceIndex(
+        meta["manifest"], meta["signature"], meta["names"],
+        meta["offsets"], descriptors, keypoints
+    )
+
+
+def get_index(detector, signature, reference_dir=REFERENCE_DIR, index_dir=INDEX_DIR):
+    """Loads the persisted bank, rebuilding it if the library or detector changed."""
+    index = load_index(index_dir)
+    if index is None or index.signature != signature or index.manifest != scan_manifest(reference_dir):
+        index = build_index(detector, signature, reference_dir, index_dir)
+    return index
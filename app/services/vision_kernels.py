@@ -0,0 +1,65 @@
+"""
+Hot-loop kernels for the vision engine.
+Numba-compiled when numba is installed (cached to __pycache__, so only the
+first process start pays for compilation); NumPy fallbacks otherwise.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _filter_and_gather_numpy(dists, q_idx, t_idx, q_pts, r_pts, ratio):
+    keep = dists[:, 0] < ratio * dists[:, 1]
+    t_keep = t_idx[keep]
+    return q_pts[q_idx[keep]], r_pts[t_keep], t_keep
+
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def _filter_and_gather_numba(dists, q_idx, t_idx, q_pts, r_pts, ratio):
+        n = 0
+        for i in range(dists.shape[0]):
+            if dists[i, 0] < ratio * dists[i, 1]:
+                n += 1
+
+        src_pts = np.empty((n, 2), np.float32)
+        dst_pts = np.empty((n, 2), np.float32)
+        t_keep = np.empty(n, np.int32)
+        j = 0
+        for i in range(dists.shape[0]):
+            if dists[i, 0] < ratio * dists[i, 1]:
+                q, t = q_idx[i], t_idx[i]
+                src_pts[j, 0] = q_pts[q, 0]
+                src_pts[j, 1] = q_pts[q, 1]
+                dst_pts[j, 0] = r_pts[t, 0]
+                dst_pts[j, 1] = r_pts[t, 1]
+                t_keep[j] = t
+                j += 1
+        return src_pts, dst_pts, t_keep
+
+
+def filter_and_gather(dists, q_idx, t_idx, q_pts, r_pts, ratio):
+    """
+    Lowe's ratio test fused with the point gather. Returns (src_pts, dst_pts,
+    t_keep): float32[n, 2] query / reference coordinates and the bank row of
+    every surviving match, in match order.
+    """
+    if njit is None:
+        return _filter_and_gather_numpy(dists, q_idx, t_idx, q_pts, r_pts, ratio)
+    # np.memmap is an ndarray subclass Numba cannot type; pass a plain view
+    return _filter_and_gather_numba(
+        dists, q_idx, t_idx, np.asarray(q_pts), np.asarray(r_pts), np.float32(ratio)
+    )
+
+
+def warmup():
+    """Compiles (or loads from cache) the kernels at startup instead of on the first scan."""
+    q_pts = np.zeros((1, 2), np.float32)
+    r_pts = np.zeros((1, 2), np.float32)
+    r_pts.setflags(write=False)  # the reference keypoint bank is a read-only memmap
+    filter_and_gather(
+        np.zeros((1, 2), np.float32), np.zeros(1, np.int32), np.zeros(1, np.int32), q_pts, r_pts, 0.75
+    )
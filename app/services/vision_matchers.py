@@ -0,0 +1,183 @@
+"""
+2-NN descriptor search backends for the vision engine.
+Every matcher exposes `knn2(des_query) -> (dists, q_idx, t_idx)`:
+dists is float32[n, 2] (best, second-best Hamming distance), q_idx the query
+row and t_idx the bank row of the best neighbour, one entry per query
+descriptor that has two neighbours.
+"""
+import os
+
+import numpy as np
+
+DESCRIPTOR_BITS = 256
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def _empty():
+    return np.empty((0, 2), np.float32), np.empty(0, np.int32), np.empty(0, np.int32)
+
+
+class CvMatcher:
+    """Adapts an OpenCV DescriptorMatcher (FLANN, BF or cv2.cuda) to knn2."""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+
+    def knn2(self, des_query):
+        matches = self.matcher.knnMatch(des_query, k=2)
+
+        # Flatten the DMatch pairs into arrays once; everything after is vectorized
+        pairs = [pair for pair in matches if len(pair) == 2]
+        if not pairs:
+            return _empty()
+        dists = np.array([(m.distance, n.distance) for m, n in pairs], dtype=np.float32)
+        q_idx = np.fromiter((m.queryIdx for m, _ in pairs), np.int32, len(pairs))
+        t_idx = np.fromiter((m.trainIdx for m, _ in pairs), np.int32, len(pairs))
+        return dists, q_idx, t_idx
+
+
+def _signed_bits(descriptors, device):
+    """uint8[N, 32] descriptors -> float32[N, 256] tensor of ±1 bits on `device`."""
+    bits = torch.from_numpy(np.unpackbits(np.asarray(descriptors), axis=1)).to(device)
+    return bits.to(torch.float32).mul_(2).sub_(1)
+
+
+def torch_bank(descriptors):
+    """Uploads the descriptor bank once; shared read-only by every TorchHammingMatcher."""
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return _signed_bits(descriptors, device)
+
+
+class TorchHammingMatcher:
+    """
+    Exact Hamming 2-NN on a torch device. With ±1 bit vectors,
+    hamming(a, b) = (256 - a·b) / 2, so the whole search is one matmul per
+    chunk of query rows followed by topk.
+    """
+
+    CHUNK_ROWS = 512  # query rows per matmul; bounds the distance block to 512 x N
+
+    def __init__(self, bank):
+        self.bank = bank
+
+    def knn2(self, des_query):
+        if self.bank.shape[0] < 2:
+            return _empty()
+
+        query = _signed_bits(des_query, self.bank.device)
+        dists, t_idx = [], []
+        with torch.inference_mode():
+            for chunk in query.split(self.CHUNK_ROWS):
+                hamming = (DESCRIPTOR_BITS - chunk @ self.bank.T).mul_(0.5)
+                d, i = torch.topk(hamming, 2, dim=1, largest=False)
+                dists.append(d)
+                t_idx.append(i[:, 0])
+
+        dists = torch.cat(dists).cpu().numpy()
+        t_idx = torch.cat(t_idx).to(torch.int32).cpu().numpy()
+        return dists, np.arange(len(dists), dtype=np.int32), t_idx
+
+
+def _unpacked_bits(descriptors):
+    """uint8[N, 32] -> float32[N, 256] of 0/1 bits: squared L2 on these is Hamming."""
+    return np.unpackbits(np.asarray(descriptors), axis=1).astype(np.float32)
+
+
+def hnsw_bank(descriptors, cache_path, ef=64):
+    """
+    HNSW graph over the unpacked bank (hnswlib has no Hamming space; squared
+    L2 on 0/1 vectors is the Hamming distance). The graph is persisted at
+    `cache_path`, which must name this exact bank, so restarts skip the build.
+    """
+    data = _unpacked_bits(descriptors)
+    index = hnswlib.Index(space="l2", dim=DESCRIPTOR_BITS)
+    if os.path.exists(cache_path):
+        index.load_index(cache_path, max_elements=len(data))
+    else:
+        index.init_index(max_elements=len(data), M=16, ef_construction=200)
+        index.add_items(data, np.arange(len(data)))
+
+        cache_dir = os.path.dirname(cache_path)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        index.save_index(tmp_path)
+        os.replace(tmp_path, cache_path)
+        # Drop graphs built for earlier banks
+        with os.scandir(cache_dir) as it:
+            for e in it:
+                if e.name.startswith("hnsw-") and e.name.endswith(".bin") and e.path != cache_path:
+                    os.unlink(e.path)
+    index.set_ef(ef)
+    return index
+
+
+class HnswMatcher:
+    """Approximate 2-NN over a shared hnswlib graph; query time grows ~log(N)."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def knn2(self, des_query):
+        if self.index.get_current_count() < 2:
+            return _empty()
+        labels, dists = self.index.knn_query(_unpacked_bits(des_query), k=2)
+        return dists, np.arange(len(dists), dtype=np.int32), labels[:, 0].astype(np.int32)
+
+
+# Per-byte popcount table for NumPy < 2.0, which lacks np.bitwise_count
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+
+def numpy_bank(descriptors):
+    """Descriptor bank as uint64[4, N]: one contiguous row per 64-bit lane."""
+    return np.ascontiguousarray(np.ascontiguousarray(descriptors).view(np.uint64).T)
+
+
+def _popcount(x):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+class NumpyHammingMatcher:
+    """
+    Exact Hamming 2-NN in plain NumPy: per 64-bit lane, XOR a block of query
+    rows against the bank, popcount (np.bitwise_count, table fallback) and
+    accumulate; argpartition then picks the two nearest per row.
+    """
+
+    CHUNK_ROWS = 16  # query rows per block; bounds each lane's XOR block to 16 x N
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+
+    def knn2(self, des_query):
+        if self.lanes.shape[1] < 2:
+            return _empty()
+
+        query64 = np.ascontiguousarray(des_query).view(np.uint64)
+        dists = np.empty((len(query64), 2), np.float32)
+        t_idx = np.empty(len(query64), np.int32)
+        rows = np.arange(min(self.CHUNK_ROWS, len(query64)))[:, None]
+        for start in range(0, len(query64), self.CHUNK_ROWS):
+            chunk = query64[start:start + self.CHUNK_ROWS]
+            # Lane by lane keeps the temporaries 2-D and the popcounts in uint8
+            hamming = _popcount(chunk[:, 0, None] ^ self.lanes[0]).astype(np.uint16)
+            for lane in range(1, self.lanes.shape[0]):
+                hamming += _popcount(chunk[:, lane, None] ^ self.lanes[lane])
+
+            # Two smallest per row, then order them (best first)
+            r = rows[:len(chunk)]
+            top2 = np.argpartition(hamming, 1, axis=1)[:, :2]
+            top2 = top2[r, np.argsort(hamming[r, top2], axis=1, kind="stable")]
+            dists[start:start + len(chunk)] = hamming[r, top2]
+            t_idx[start:start + len(chunk)] = top2[:, 0]
+        return dists, np.arange(len(dists), dtype=np.int32), t_idx
@@ -0,0 +1,23 @@
+"""
+Shared Jinja2 environment for every router.
+Compiled templates are persisted to a bytecode cache so restarts and new
+workers skip re-parsing; in production (ENV=prod) the per-render template
+mtime check is switched off as well.
+"""
+import os
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+TEMPLATE_DIR = "templates"
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(),
+    auto_reload=os.getenv("ENV") != "prod",
+    # No directory argument: Jinja uses a per-uid 0700 temp dir and refuses one
+    # owned by another user, so nobody else can plant marshalled bytecode
+    bytecode_cache=FileSystemBytecodeCache(),
+)
+
+templates = Jinja2Templates(env=env)
@@ -1,13 +1,13 @@
 import os
 import json
+import asyncio
 import uvicorn
-import threading
 import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Form
-from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from dotenv import load_dotenv
 
 # Load Environment Variables
@@ -15,7 +15,67 @@ load_dotenv()
 
 # 1. Import Inkwake Module Suite
 from app.api import chatbot, recognition, explorer, admin
-from app.database import log_security_event, save_enquiry
+from app.database import (
+    SECURITY_BATCH_SIZE, close_connections, flush_security_events, log_security_event, save_enquiry
+)
+from app.services import sites_cache
+from app.templating import templates
+
+# --- Security Vault Writer ---
+SECURITY_FLUSH_INTERVAL = 0.25  # seconds
+SECURITY_FLUSH_THRESHOLD = 100  # buffered events that trigger an early flush
+_flush_wakeup = asyncio.Event()
+
+async def security_flush_loop():
+    """
+    Background Task: drains buffered security events into SQLite in batches,
+    every SECURITY_FLUSH_INTERVAL or as soon as the middleware reports a full backlog.
+    """
+    while True:
+        try:
+            async with asyncio.timeout(SECURITY_FLUSH_INTERVAL):
+                await _flush_wakeup.wait()
+        except TimeoutError:
+            pass
+        _flush_wakeup.clear()
+        try:
+            # Keep draining while bursts leave more than one batch queued
+            while await run_in_threadpool(flush_security_events) == SECURITY_BATCH_SIZE:
+                pass
+        except Exception as e:
+            print(f"Security Flush Error: {e}")
+
+# --- Storage Cleanup Engine ---
+AUDIO_DIR = "static/audio"
+AUDIO_MAX_AGE = 86400    # seconds; clips untouched for a day are purged
+CLEANUP_INTERVAL = 3600  # seconds
+
+def cleanup_temp_files():
+    """
+    Purges neural audio cache older than 24 hours (cache hits refresh a clip's mtime).
+    Crucial for AWS EC2 instances with limited storage.
+    """
+    if not os.path.exists(AUDIO_DIR):
+        return
+    cutoff = time.time() - AUDIO_MAX_AGE
+    with os.scandir(AUDIO_DIR) as it:
+        for entry in it:
+            # Every worker sweeps on the same schedule: clips another one
+            # already removed just vanish from under us
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+async def cleanup_loop():
+    """Background Task: runs the audio sweep off the event loop every hour."""
+    while True:
+        try:
+            await run_in_threadpool(cleanup_temp_files)
+        except Exception as e:
+            print(f"Cleanup Task Error: {e}")
+        await asyncio.sleep(CLEANUP_INTERVAL)
 
 # --- Modern Lifespan Handler (Replaces @app.on_event) ---
 @asynccontextmanager
@@ -35,52 +95,36 @@ async def lifespan(app: FastAPI):
     
     # Initialize JSON DB files if missing
     db_files = {
-        "app/data/sites_info.json": [],
-        "app/data/users_info.json": []
+        "app/data/sites_info.json": []
     }
     for path, default_val in db_files.items():
         if not os.path.exists(path):
             with open(path, "w", encoding="utf-8") as f:
                 json.dump(default_val, f)
     
+    flush_task = asyncio.create_task(security_flush_loop())
+    cleanup_task = asyncio.create_task(cleanup_loop())
+    
     print("🚀 Inkwake Heritage Node [v2.6] Online & Secured")
     yield
-    # Shutdown logic can go here if needed
+    cleanup_task.cancel()
+    flush_task.cancel()
+    # Persist any events still buffered, then release the pooled SQLite vault connections
+    flush_security_events(None)
+    close_connections()
 
 app = FastAPI(
     title="Inkwake Heritage Guide",
     description="AI-Powered Cultural Discovery Platform for Tamil Nadu Heritage",
     version="2.6.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # dict/list route results are encoded with orjson instead of stdlib json
+    default_response_class=ORJSONResponse
 )
 
 # 2. Asset Configuration & Static Mounting
-templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# --- Storage Cleanup Engine ---
-def cleanup_temp_files():
-    """
-    Background Task: Automatically purges neural audio cache older than 24 hours.
-    Crucial for AWS EC2 instances with limited storage.
-    """
-    while True:
-        try:
-            audio_dir = "static/audio"
-            if os.path.exists(audio_dir):
-                now = time.time()
-                for f in os.listdir(audio_dir):
-                    file_path = os.path.join(audio_dir, f)
-                    # If file is older than 1 day
-                    if os.path.getmtime(file_path) < now - 86400:
-                        os.remove(file_path)
-        except Exception as e:
-            print(f"Cleanup Thread Error: {e}")
-        time.sleep(3600)  # Runs every hour
-
-# Initialize Cleanup Thread as a background daemon
-threading.Thread(target=cleanup_temp_files, daemon=True).start()
-
 # --- Security & Traffic Middleware ---
 @app.middleware("http")
 async def monitor_activity(request: Request, call_next):
@@ -89,7 +133,8 @@ async def monitor_activity(request: Request, call_next):
     path = request.url.path
     
     if path.startswith("/admin") or path.startswith("/recognition"):
-        log_security_event(client_ip, f"ACCESS_TRIGGER: {request.method} {path}")
+        if log_security_event(client_ip, f"ACCESS_TRIGGER: {request.method} {path}") >= SECURITY_FLUSH_THRESHOLD:
+            _flush_wakeup.set()
         
     return await call_next(request)
 
@@ -128,23 +173,19 @@ async def handle_enquiry(
     Handles POST data from the Enquiry Page. 
     Returns JSON for the new AJAX frontend to handle success states without reloading.
     """
-    success = save_enquiry(name, email, subject, message)
+    success = await run_in_threadpool(save_enquiry, name, email, subject, message)
     if success:
-        return JSONResponse(content={"status": "success", "message": "Enquiry Archived in Vault"})
+        return ORJSONResponse(content={"status": "success", "message": "Enquiry Archived in Vault"})
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500, 
         content={"status": "error", "message": "Vault Persistence Failure"}
     )
 
 @app.get("/site/{site_id}", response_class=HTMLResponse)
 async def monument_details(request: Request, site_id: str):
-    json_path = "app/data/sites_info.json"
-    site_data = None
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            sites = json.load(f)
-            site_data = next((s for s in sites if s.get("id") == site_id), None)
+    # Parsed vault + by-id dict are cached until sites_info.json changes on disk
+    site_data = await run_in_threadpool(sites_cache.get_site, site_id)
     
     if not site_data:
         return templates.TemplateResponse("404.html", {"request": request}, status_code=404)
@@ -157,5 +198,22 @@ async def custom_404_handler(request: Request, exc):
     return templates.TemplateResponse("404.html", {"request": request}, status_code=404)
 
 # --- Server Launch ---
+# DEV=1 keeps the single auto-reloading worker; otherwise one worker per core.
+# "auto" picks uvloop/httptools when installed and falls back to asyncio/h11.
+RELOAD = os.getenv("DEV") == "1"
+WORKERS = 1 if RELOAD else os.cpu_count() or 1
+LIMIT_CONCURRENCY = int(os.getenv("LIMIT_CONCURRENCY", "200"))  # per worker; excess gets a 503
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Workers inherit the environment: give each its share of the cores for vision compute
+    os.environ.setdefault("VISION_THREADS", str(max(1, (os.cpu_count() or 1) // WORKERS)))
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=RELOAD,
+        workers=WORKERS,
+        loop="auto",
+        http="auto",
+        limit_concurrency=LIMIT_CONCURRENCY,
+    )